@@ -1,6 +1,8 @@
 import sqlite3
 import os
 
+import profiler
+
 DB_PATH = os.getenv("DB_PATH", os.path.join(os.path.dirname(__file__), "users.db"))
 
 
@@ -10,6 +12,7 @@ def get_conn():
     return conn
 
 
+@profiler.traced
 def init_db():
     """Create tables if they don't exist."""
     conn = get_conn()
@@ -34,6 +37,7 @@ DEFAULT_USERS = {
 }
 
 
+@profiler.traced
 def populate_defaults():
     """Insert the default users if they are missing."""
     conn = get_conn()
@@ -48,6 +52,7 @@ def populate_defaults():
     conn.close()
 
 
+@profiler.traced
 def get_user(username):
     conn = get_conn()
     cur = conn.execute("SELECT * FROM users WHERE username=?", (username,))
@@ -56,6 +61,7 @@ def get_user(username):
     return row
 
 
+@profiler.traced
 def set_password(username, password):
     conn = get_conn()
     conn.execute("UPDATE users SET password=? WHERE username=?", (password, username))
@@ -63,6 +69,7 @@ def set_password(username, password):
     conn.close()
 
 
+@profiler.traced
 def set_limit(username, minutes):
     conn = get_conn()
     conn.execute(
@@ -73,6 +80,7 @@ def set_limit(username, minutes):
     conn.close()
 
 
+@profiler.traced
 def add_user(username, password, minutes):
     conn = get_conn()
     conn.execute(
@@ -84,6 +92,7 @@ def add_user(username, password, minutes):
     conn.close()
 
 
+@profiler.traced
 def list_users():
     conn = get_conn()
     rows = conn.execute(
@@ -93,6 +102,7 @@ def list_users():
     return rows
 
 
+@profiler.traced
 def deduct_minutes(username, minutes):
     conn = get_conn()
     cur = conn.execute(
@@ -0,0 +1,124 @@
+"""Minimal MP4/M4A atom handling used to make uploads "faststart".
+
+A faststart file has its ``moov`` atom (the index) before the ``mdat`` atom
+(the audio data). Moving ``moov`` forward shifts the audio data, so the
+absolute chunk offsets stored in every ``stco``/``co64`` table are patched by
+the size of the moved atom.
+"""
+
+import struct
+
+# Atoms that only contain other atoms on the path to the chunk offset tables.
+CONTAINERS = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+# Real files nest moov/trak/mdia/minf/stbl; deeper trees are rejected.
+MAX_DEPTH = 8
+
+
+def iter_atoms(data, start: int = 0, end: int | None = None):
+    """Yield ``(type, offset, header_size, size)`` for atoms in ``data``.
+
+    Raises ``ValueError`` if an atom header is truncated or its size does not
+    fit in the enclosing range.
+    """
+    if end is None:
+        end = len(data)
+    pos = start
+    while pos < end:
+        if end - pos < 8:
+            raise ValueError(f"truncated atom header at offset {pos}")
+        size, kind = struct.unpack_from(">I4s", data, pos)
+        header = 8
+        if size == 1:
+            if end - pos < 16:
+                raise ValueError(f"truncated atom header at offset {pos}")
+            (size,) = struct.unpack_from(">Q", data, pos + 8)
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            raise ValueError(f"invalid size for atom {kind!r} at offset {pos}")
+        yield kind, pos, header, size
+        pos += size
+
+
+def _chunk_offset_tables(moov, start: int, end: int, depth: int = 1):
+    """Yield ``(type, start, end)`` of every ``stco``/``co64`` atom body."""
+    if depth > MAX_DEPTH:
+        raise ValueError("atoms nested too deeply")
+    for kind, pos, header, size in iter_atoms(moov, start, end):
+        if kind in CONTAINERS:
+            yield from _chunk_offset_tables(
+                moov, pos + header, pos + size, depth + 1
+            )
+        elif kind in (b"stco", b"co64"):
+            yield kind, pos + header, pos + size
+        elif kind == b"cmov":
+            raise ValueError("compressed moov atoms are not supported")
+
+
+def _patch_chunk_offsets(
+    moov: bytearray, header: int, low: int, high: int, shift: int
+) -> None:
+    """Add ``shift`` to chunk offsets in ``[low, high)`` within ``moov``."""
+    # Walk the atom tree before patching so the walk never sees patched bytes.
+    tables = list(_chunk_offset_tables(moov, header, len(moov)))
+    for kind, pos, end in tables:
+        if end - pos < 8:
+            raise ValueError(f"truncated {kind.decode()} table")
+        # Skip the version/flags word.
+        (count,) = struct.unpack_from(">I", moov, pos + 4)
+        width, fmt = (8, ">Q") if kind == b"co64" else (4, ">I")
+        if 8 + count * width > end - pos:
+            raise ValueError(f"truncated {kind.decode()} table")
+        entries = pos + 8
+        limit = 1 << (8 * width)
+        for i in range(count):
+            at = entries + i * width
+            (offset,) = struct.unpack_from(fmt, moov, at)
+            if low <= offset < high:
+                offset += shift
+                if offset >= limit:
+                    raise ValueError("chunk offset overflows stco table")
+                struct.pack_into(fmt, moov, at, offset)
+
+
+def faststart(data: bytes) -> bytes:
+    """Return ``data`` with its ``moov`` atom placed before ``mdat``.
+
+    Files that are already faststart are returned unchanged after scanning
+    the top-level atom headers. Raises ``ValueError`` for data that cannot be
+    parsed or rewritten.
+    """
+    insert_at = None
+    moov = None
+    for kind, pos, header, size in iter_atoms(data):
+        if kind == b"mdat" and insert_at is None:
+            insert_at = pos
+        elif kind == b"moov":
+            if insert_at is None:
+                return data
+            moov = (pos, header, size)
+            break
+    if insert_at is None or moov is None:
+        raise ValueError("no moov or mdat atom found")
+
+    moov_start, moov_header, moov_size = moov
+    view = memoryview(data)
+    moov_atom = bytearray(view[moov_start : moov_start + moov_size])
+    if moov_header == 8 and struct.unpack_from(">I", moov_atom)[0] == 0:
+        # A size of 0 means "to the end of the file", which stops being true
+        # once moov is moved in front of mdat; store the real size instead.
+        if moov_size > 0xFFFFFFFF:
+            raise ValueError("moov atom too large to move")
+        struct.pack_into(">I", moov_atom, 0, moov_size)
+    # Everything between the insertion point and the old moov position moves
+    # forward by the size of moov; data after the old moov stays put.
+    _patch_chunk_offsets(moov_atom, moov_header, insert_at, moov_start, moov_size)
+    return b"".join(
+        (
+            view[:insert_at],
+            moov_atom,
+            view[insert_at:moov_start],
+            view[moov_start + moov_size :],
+        )
+    )
@@ -9,12 +9,13 @@ import logging
 import math
 import subprocess
 import tempfile
-import shutil
 
 # Ensure .m4a files are recognised with a suitable MIME type
 mimetypes.add_type("audio/m4a", ".m4a")
 
 import db
+import m4a
+import profiler
 
 from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Form
 import re
@@ -30,6 +31,9 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI()
 
+if profiler.ENABLED:
+    app.add_middleware(profiler.ProfilerMiddleware)
+
 db.init_db()
 db.populate_defaults()
 
@@ -51,7 +55,8 @@ def convert_to_mp3(data: bytes, ext: str) -> bytes:
             output_path,
         ]
         try:
-            subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            with profiler.span("subprocess.ffmpeg"):
+                subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
         except Exception as exc:
             logger.exception("ffmpeg conversion failed")
             raise RuntimeError("Audio conversion failed") from exc
@@ -62,45 +67,16 @@ def convert_to_mp3(data: bytes, ext: str) -> bytes:
 def fix_m4a_faststart(data: bytes) -> bytes:
     """Rewrite an M4A file so the moov atom is at the front.
 
-    If ``ffmpeg`` is not available or fails this function returns the original
-    bytes instead of raising an exception. This avoids 500 errors when the
-    server does not have ``ffmpeg`` installed.
+    The atoms are rearranged in-process, so ``ffmpeg`` is not needed. If the
+    file cannot be parsed this function returns the original bytes instead of
+    raising an exception, so transcription can still proceed.
     """
-    if shutil.which("ffmpeg") is None:
-        logger.warning("ffmpeg not found; skipping faststart fix")
+    try:
+        return m4a.faststart(data)
+    except ValueError:
+        logger.warning("M4A faststart failed; returning original data", exc_info=True)
         return data
 
-    with tempfile.TemporaryDirectory() as tmpdir:
-        input_path = os.path.join(tmpdir, "input.m4a")
-        output_path = os.path.join(tmpdir, "output.m4a")
-        with open(input_path, "wb") as f:
-            f.write(data)
-        cmd = [
-            "ffmpeg",
-            "-y",
-            "-i",
-            input_path,
-            "-c",
-            "copy",
-            "-movflags",
-            "+faststart",
-            output_path,
-        ]
-        try:
-            subprocess.run(
-                cmd,
-                check=True,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-            )
-        except Exception:
-            # Log the error but fall back to the original data so that
-            # transcription can still proceed.
-            logger.exception("ffmpeg faststart failed; returning original data")
-            return data
-        with open(output_path, "rb") as f:
-            return f.read()
-
 
 def sniff_extension(data: bytes) -> str | None:
     """Guess the audio file extension based on its header."""
@@ -232,8 +208,9 @@ def call_whisper(file_bytes: bytes, filename: str, language: str | None = None)
     logger.debug("Sending request to %s", OPENAI_URL)
     req = urllib.request.Request(OPENAI_URL, data=body, headers=headers)
     try:
-        with urllib.request.urlopen(req, timeout=timeout) as resp:
-            data = json.load(resp)
+        with profiler.span("whisper.http"):
+            with urllib.request.urlopen(req, timeout=timeout) as resp:
+                data = json.load(resp)
     except urllib.error.HTTPError as exc:  # pragma: no cover - network errors hard to trigger in tests
         try:
             body = exc.read().decode()
@@ -270,8 +247,9 @@ async def transcribe(
     if not user:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
-    data = await file.read()
-    await file.close()
+    with profiler.span("upload.spool_read"):
+        data = await file.read()
+        await file.close()
     logger.debug("Received %s (%d bytes)", file.filename, len(data))
 
     ext = os.path.splitext(file.filename or "")[1].lower()
@@ -283,12 +261,14 @@ async def transcribe(
         file.filename = os.path.splitext(file.filename or "audio")[0] + sniffed
         if sniffed == ".m4a":
             try:
-                data = fix_m4a_faststart(data)
+                with profiler.span("faststart"):
+                    data = fix_m4a_faststart(data)
             except Exception as exc:
                 raise HTTPException(status_code=500, detail=str(exc))
     else:
         try:
-            data = convert_to_mp3(data, sniffed or ".dat")
+            with profiler.span("convert"):
+                data = convert_to_mp3(data, sniffed or ".dat")
             file.filename = os.path.splitext(file.filename or "audio")[0] + ".mp3"
         except Exception as exc:
             raise HTTPException(status_code=500, detail=str(exc))
@@ -298,7 +278,8 @@ async def transcribe(
         raise HTTPException(status_code=400, detail="Recognition limit exceeded")
 
     try:
-        text = call_whisper(data, file.filename, language)
+        with profiler.span("whisper"):
+            text = call_whisper(data, file.filename, language)
         text = format_sentences(text)
     except Exception as exc:
         logger.exception("Transcription failed")
@@ -0,0 +1,100 @@
+import argparse
+import glob
+import json
+import os
+
+import profiler
+
+UNTRACKED = "(untracked)"
+
+
+def dump_files(path):
+    """Return the dump file and its rotated backups, oldest first."""
+    backups = []
+    for name in glob.glob(glob.escape(path) + ".*"):
+        suffix = name[len(path) + 1:]
+        if suffix.isdigit():
+            backups.append((int(suffix), name))
+    files = [name for _, name in sorted(backups, reverse=True)]
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+
+def load_traces(path):
+    """Read every trace written to ``path`` and its backups."""
+    traces = []
+    for name in dump_files(path):
+        with open(name, "r", encoding="utf-8") as fh:
+            for line in fh:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    traces.append(json.loads(line))
+                except ValueError:
+                    continue
+    return traces
+
+
+def summarize(traces):
+    """Aggregate span timings by stage, slowest total time first.
+
+    Time not covered by a top-level span is reported as ``(untracked)``.
+    """
+    stats = {}
+
+    def add(name, duration):
+        entry = stats.setdefault(
+            name, {"stage": name, "count": 0, "total_ms": 0.0, "max_ms": 0.0}
+        )
+        entry["count"] += 1
+        entry["total_ms"] += duration
+        entry["max_ms"] = max(entry["max_ms"], duration)
+
+    for trace in traces:
+        spans = trace.get("spans", [])
+        for span in spans:
+            add(span["name"], span["duration_ms"])
+        tracked = sum(s["duration_ms"] for s in spans if s.get("depth", 0) == 0)
+        add(UNTRACKED, max(trace.get("duration_ms", 0.0) - tracked, 0.0))
+
+    for entry in stats.values():
+        entry["mean_ms"] = entry["total_ms"] / entry["count"]
+    return sorted(stats.values(), key=lambda e: e["total_ms"], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize request profile dumps")
+    parser.add_argument("path", nargs="?", default=profiler.PROFILE_PATH)
+    parser.add_argument("--top", type=int, default=10, help="Stages to show")
+    parser.add_argument(
+        "--slowest", type=int, default=5, help="Slowest requests to list"
+    )
+    args = parser.parse_args()
+
+    traces = load_traces(args.path)
+    if not traces:
+        print(f"No traces found in {args.path}")
+        return
+
+    print(f"{len(traces)} traces")
+    print(f"{'stage':<28}{'count':>7}{'total ms':>12}{'mean ms':>10}{'max ms':>10}")
+    for entry in summarize(traces)[: args.top]:
+        print(
+            f"{entry['stage']:<28}{entry['count']:>7}{entry['total_ms']:>12.1f}"
+            f"{entry['mean_ms']:>10.1f}{entry['max_ms']:>10.1f}"
+        )
+
+    print()
+    print("Slowest requests:")
+    slowest = sorted(traces, key=lambda t: t.get("duration_ms", 0.0), reverse=True)
+    for trace in slowest[: args.slowest]:
+        print(
+            f"{trace.get('trace_id')} {trace.get('method')} {trace.get('path')}"
+            f" {trace.get('status')} {trace.get('duration_ms', 0.0):.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""Opt-in per-request profiling for slow ``/transcribe`` calls.
+
+Set ``PROFILE_ENABLED=1`` to install :class:`ProfilerMiddleware`. Every
+request then gets a trace id (returned in the ``X-Trace-Id`` header) and the
+code wrapped in :func:`span` or :func:`traced` records its timings on that
+trace. Requests slower than ``PROFILE_SLOW_MS`` or picked by
+``PROFILE_SAMPLE_RATE`` are written as one JSON line to ``PROFILE_PATH``,
+which is rotated once it grows past ``PROFILE_MAX_BYTES``. Use
+``profile_report.py`` to summarise the dumps.
+
+When no trace is active :func:`span` returns a shared no-op object, so the
+instrumentation costs a single context variable lookup.
+"""
+
+import contextvars
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import random
+import time
+import uuid
+
+import anyio
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv("PROFILE_ENABLED", "0") == "1"
+PROFILE_PATH = os.getenv(
+    "PROFILE_PATH", os.path.join(os.path.dirname(__file__), "profiles.jsonl")
+)
+
+_current = contextvars.ContextVar("profiler_trace", default=None)
+
+
+class Trace:
+    """Span timings collected for a single request."""
+
+    def __init__(self, trace_id: str, method: str, path: str):
+        self.trace_id = trace_id
+        self.method = method
+        self.path = path
+        self.start = time.perf_counter()
+        self.spans = []
+        self.depth = 0
+
+    def to_dict(self, status: int | None, duration_ms: float) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "method": self.method,
+            "path": self.path,
+            "status": status,
+            "timestamp": time.time(),
+            "duration_ms": round(duration_ms, 3),
+            "spans": self.spans,
+        }
+
+
+class _Span:
+    __slots__ = ("trace", "name", "start", "depth")
+
+    def __init__(self, trace: Trace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.depth = self.trace.depth
+        self.trace.depth += 1
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        trace = self.trace
+        trace.depth -= 1
+        record = {
+            "name": self.name,
+            "start_ms": round((self.start - trace.start) * 1000, 3),
+            "duration_ms": round((end - self.start) * 1000, 3),
+            "depth": self.depth,
+        }
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        trace.spans.append(record)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str):
+    """Return a context manager timing ``name`` on the current trace."""
+    trace = _current.get()
+    if trace is None:
+        return _NOOP
+    return _Span(trace, name)
+
+
+def traced(func):
+    """Decorator recording each call of ``func`` as a span."""
+    name = f"{func.__module__}.{func.__name__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        trace = _current.get()
+        if trace is None:
+            return func(*args, **kwargs)
+        with _Span(trace, name):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+class ProfilerMiddleware:
+    """ASGI middleware assigning trace ids and dumping slow or sampled traces."""
+
+    def __init__(
+        self,
+        app,
+        slow_ms: float | None = None,
+        sample_rate: float | None = None,
+        path: str | None = None,
+        max_bytes: int | None = None,
+        backup_count: int | None = None,
+    ):
+        self.app = app
+        if slow_ms is None:
+            slow_ms = float(os.getenv("PROFILE_SLOW_MS", "1000"))
+        if sample_rate is None:
+            sample_rate = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+        if max_bytes is None:
+            max_bytes = int(os.getenv("PROFILE_MAX_BYTES", str(10 * 1024 * 1024)))
+        if backup_count is None:
+            backup_count = int(os.getenv("PROFILE_BACKUPS", "5"))
+        self.slow_ms = slow_ms
+        self.sample_rate = sample_rate
+        self.path = path or PROFILE_PATH
+        self._handler = logging.handlers.RotatingFileHandler(
+            self.path,
+            maxBytes=max_bytes,
+            backupCount=backup_count,
+            encoding="utf-8",
+            delay=True,
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+
+            async def send_lifespan(message):
+                if message["type"] == "lifespan.shutdown.complete":
+                    self.close()
+                await send(message)
+
+            await self.app(scope, receive, send_lifespan)
+            return
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(uuid.uuid4().hex, scope.get("method", ""), scope.get("path", ""))
+        trace_header = (b"x-trace-id", trace.trace_id.encode())
+        status = None
+
+        async def send_with_trace(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append(trace_header)
+                message = {**message, "headers": headers}
+            await send(message)
+
+        # FastAPI parses the multipart body before the endpoint runs, so the
+        # upload is timed here as the time spent waiting for body messages.
+        body_start = None
+        body_ms = 0.0
+
+        async def receive_with_timing():
+            nonlocal body_start, body_ms
+            start = time.perf_counter()
+            message = await receive()
+            if message["type"] == "http.request":
+                if body_start is None:
+                    body_start = start
+                body_ms += (time.perf_counter() - start) * 1000
+            return message
+
+        token = _current.set(trace)
+        try:
+            await self.app(scope, receive_with_timing, send_with_trace)
+        finally:
+            _current.reset(token)
+            if body_start is not None:
+                trace.spans.append(
+                    {
+                        "name": "upload.receive",
+                        "start_ms": round((body_start - trace.start) * 1000, 3),
+                        "duration_ms": round(body_ms, 3),
+                        "depth": 0,
+                    }
+                )
+            duration_ms = (time.perf_counter() - trace.start) * 1000
+            logger.debug(
+                "trace %s %s %s took %.1f ms",
+                trace.trace_id,
+                trace.method,
+                trace.path,
+                duration_ms,
+            )
+            if duration_ms >= self.slow_ms or random.random() < self.sample_rate:
+                # Writing and rotating the dump blocks, so keep it off the loop.
+                record = trace.to_dict(status, duration_ms)
+                await anyio.to_thread.run_sync(self.write, record)
+
+    def write(self, record: dict) -> None:
+        """Append ``record`` to the dump file, rotating it when needed."""
+        line = json.dumps(record, separators=(",", ":"))
+        self._handler.handle(logging.makeLogRecord({"msg": line}))
+
+    def close(self) -> None:
+        """Close the dump file; called on lifespan shutdown."""
+        self._handler.close()
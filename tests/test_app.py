@@ -1,5 +1,6 @@
 import io
 import os
+import struct
 import sys
 import tempfile
 
@@ -13,6 +14,8 @@ os.environ["DB_PATH"] = os.path.join(TMPDIR.name, "test.db")
 
 import main
 import db
+import profiler
+import profile_report
 
 
 def setup_module(module):
@@ -215,3 +218,167 @@ def test_m4a_chunk_conversion(monkeypatch):
     assert called.get('fix')
     assert called['data'] == b'fixed'
     assert called['filename'].endswith('.m4a')
+
+
+def test_profiler_dumps_slow_request(monkeypatch, tmp_path):
+    dump_path = str(tmp_path / "profiles.jsonl")
+    app = profiler.ProfilerMiddleware(main.app, slow_ms=0, sample_rate=0, path=dump_path)
+    monkeypatch.setattr(main, 'call_whisper', lambda data, filename, language=None: 'ok')
+
+    files = {"file": ("test.mp3", io.BytesIO(b"123"), "audio/mpeg")}
+    limit = db.get_user("tester")["minutes_remaining"]
+    db.set_limit("tester", 5)
+    try:
+        with TestClient(app) as client:
+            client.cookies.set("auth", "1")
+            client.cookies.set("username", "tester")
+            response = client.post("/transcribe", files=files)
+    finally:
+        db.set_limit("tester", limit)
+    assert response.status_code == 200
+
+    traces = profile_report.load_traces(dump_path)
+    assert len(traces) == 1
+    trace = traces[0]
+    assert response.headers["x-trace-id"] == trace["trace_id"]
+    assert trace["path"] == "/transcribe"
+    assert trace["status"] == 200
+    names = [span["name"] for span in trace["spans"]]
+    assert "upload.receive" in names
+    assert "upload.spool_read" in names
+    assert "whisper" in names
+    assert "db.get_user" in names
+    assert "db.deduct_minutes" in names
+
+    stages = {entry["stage"] for entry in profile_report.summarize(traces)}
+    assert {"whisper", "db.get_user", profile_report.UNTRACKED} <= stages
+
+
+def test_profiler_skips_fast_request(tmp_path):
+    dump_path = str(tmp_path / "profiles.jsonl")
+    app = profiler.ProfilerMiddleware(main.app, slow_ms=60000, sample_rate=0, path=dump_path)
+    with TestClient(app) as client:
+        response = client.get("/login")
+    assert response.status_code == 200
+    assert "x-trace-id" in response.headers
+    assert profile_report.load_traces(dump_path) == []
+
+
+def test_profiler_rotates_dumps(tmp_path):
+    dump_path = str(tmp_path / "profiles.jsonl")
+    app = profiler.ProfilerMiddleware(
+        main.app, slow_ms=0, path=dump_path, max_bytes=200, backup_count=2
+    )
+    with TestClient(app) as client:
+        for _ in range(5):
+            client.get("/login")
+    assert app._handler.stream is None
+    assert profile_report.dump_files(dump_path) == [
+        dump_path + ".2",
+        dump_path + ".1",
+        dump_path,
+    ]
+    assert len(profile_report.load_traces(dump_path)) == 3
+
+
+def test_span_without_trace_is_noop():
+    with profiler.span("anything") as span:
+        assert span is profiler.span("other")
+
+
+def atom(kind, payload):
+    return struct.pack(">I", 8 + len(payload)) + kind + payload
+
+
+def build_m4a(moov_first, table=b"stco"):
+    ftyp = atom(b"ftyp", b"M4A \x00\x00\x00\x00")
+    chunks = [b"AAAA", b"BBBB"]
+    mdat = atom(b"mdat", b"".join(chunks))
+
+    def moov_for(first_chunk):
+        offsets = [first_chunk, first_chunk + 4]
+        fmt = ">Q" if table == b"co64" else ">I"
+        entries = b"".join(struct.pack(fmt, o) for o in offsets)
+        stco = atom(table, b"\x00\x00\x00\x00" + struct.pack(">I", 2) + entries)
+        stbl = atom(b"stbl", stco)
+        return atom(b"moov", atom(b"trak", atom(b"mdia", atom(b"minf", stbl))))
+
+    if moov_first:
+        # The moov size does not depend on the offsets it stores.
+        moov_size = len(moov_for(0))
+        return ftyp + moov_for(len(ftyp) + moov_size + 8) + mdat
+    moov = moov_for(len(ftyp) + 8)
+    return ftyp + mdat + moov
+
+
+def read_chunks(data):
+    width, fmt = (4, ">I") if b"stco" in data else (8, ">Q")
+    pos = data.index(b"stco" if b"stco" in data else b"co64") + 4
+    count = struct.unpack_from(">I", data, pos + 4)[0]
+    offsets = [
+        struct.unpack_from(fmt, data, pos + 8 + i * width)[0] for i in range(count)
+    ]
+    return [data[o:o + 4] for o in offsets]
+
+
+def test_faststart_moves_moov_and_patches_offsets():
+    for table in (b"stco", b"co64"):
+        data = build_m4a(moov_first=False, table=table)
+        fixed = main.fix_m4a_faststart(data)
+        assert len(fixed) == len(data)
+        assert fixed.index(b"moov") < fixed.index(b"mdat")
+        assert read_chunks(fixed) == [b"AAAA", b"BBBB"]
+        assert fixed == build_m4a(moov_first=True, table=table)
+
+
+def test_faststart_leaves_faststart_file_untouched():
+    data = build_m4a(moov_first=True)
+    assert main.fix_m4a_faststart(data) is data
+
+
+def test_faststart_returns_original_on_bad_data():
+    data = b"\x00\x00\x00\x18ftypm4a " + b"123"
+    assert main.fix_m4a_faststart(data) is data
+
+
+def test_faststart_returns_original_on_truncated_table():
+    ftyp = atom(b"ftyp", b"M4A \x00\x00\x00\x00")
+    mdat = atom(b"mdat", b"AAAABBBB")
+    # The stco claims three entries but only holds two; a sibling atom follows.
+    stco = atom(b"stco", b"\x00\x00\x00\x00" + struct.pack(">III", 3, 16, 20))
+    free = atom(b"free", struct.pack(">I", 17))
+    moov = atom(b"moov", atom(b"trak", atom(b"mdia", atom(b"minf", atom(b"stbl", stco + free)))))
+    data = ftyp + mdat + moov
+    assert main.fix_m4a_faststart(data) is data
+
+
+def test_faststart_returns_original_on_deep_nesting():
+    nested = b""
+    for _ in range(2000):
+        nested = atom(b"trak", nested)
+    data = atom(b"ftyp", b"M4A \x00\x00\x00\x00") + atom(b"mdat", b"AAAA") + atom(b"moov", nested)
+    assert main.fix_m4a_faststart(data) is data
+
+
+def test_faststart_fixes_size_zero_moov():
+    data = build_m4a(moov_first=False)
+    moov = data.index(b"moov") - 4
+    data = data[:moov] + b"\x00\x00\x00\x00" + data[moov + 4:]
+    assert main.fix_m4a_faststart(data) == build_m4a(moov_first=True)
+
+
+def test_transcribe_rewrites_m4a_faststart(monkeypatch):
+    client = client_with_auth()
+    called = {}
+
+    def fake_call_whisper(data, filename, language=None):
+        called['data'] = data
+        return 'ok'
+
+    monkeypatch.setattr(main, 'call_whisper', fake_call_whisper)
+
+    files = {"file": ("voice.m4a", io.BytesIO(build_m4a(moov_first=False)), "audio/mp4")}
+    response = client.post('/transcribe', files=files)
+
+    assert response.status_code == 200
+    assert called['data'] == build_m4a(moov_first=True)